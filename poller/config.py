@@ -3,8 +3,9 @@ import os
 from logging import INFO
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet
 
 # Configure logging
 logging.basicConfig(
@@ -17,9 +18,27 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Settings configuration
-@dataclass
+# Settings configuration, read once at import and shared by every module
+@dataclass(frozen=True)
 class Settings:
+    # Letta API settings
+    LETTA_BASE_URL: str = os.environ.get("LETTA_BASE_URL")
+    LETTA_PASSWORD: str = os.environ.get("LETTA_PASSWORD")
+
+    # Poller settings
+    LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO").upper()
+    # Sizes the poller's semaphore and connection pools, so at least one agent must be allowed in flight
+    POLL_CONCURRENCY: int = max(1, int(os.environ.get("POLL_CONCURRENCY", "8")))
+    ADMIN_USER_TTL_SEC: int = int(os.environ.get("ADMIN_USER_TTL_SEC", "3600"))
+    DUMP_AGENT_MESSAGES: bool = os.environ.get("DUMP_AGENT_MESSAGES") == "1"
+
+    # Agents to exclude from Graphiti ingestion, parsed once from a comma-separated list
+    EXCLUDED_AGENT_IDS: FrozenSet[str] = frozenset(
+        agent_id.strip()
+        for agent_id in os.environ.get("GRAPHITI_EXCLUDED_AGENT_IDS", "").split(",")
+        if agent_id.strip()
+    )
+
     # Graphiti HTTP API settings
     GRAPHITI_ENDPOINT: str = os.environ.get("GRAPHITI_ENDPOINT", "http://192.168.50.90:8003")
     
@@ -41,6 +60,10 @@ class GraphitiHTTPClient:
     def __init__(self, endpoint: str):
         self.endpoint = endpoint.rstrip('/')
         self.session = requests.Session()
+        # Sends for up to POLL_CONCURRENCY agents run in parallel, so size the pool like the Letta session
+        adapter = HTTPAdapter(pool_maxsize=max(32, settings.POLL_CONCURRENCY))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
     def add_messages(self, group_id: str, messages: List[Dict[str, Any]]) -> bool:
         """
@@ -2,6 +2,7 @@
 Pytest configuration for poller tests.
 """
 import sys
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 # Create mock for config module
@@ -9,6 +10,15 @@ mock_config = MagicMock()
 mock_graphiti = MagicMock()
 mock_graphiti.add_messages.return_value = True
 mock_config.init_graphiti.return_value = mock_graphiti
+mock_config.settings = SimpleNamespace(
+    LETTA_BASE_URL="http://localhost:8283",
+    LETTA_PASSWORD="test-password",
+    LOG_LEVEL="INFO",
+    POLL_CONCURRENCY=8,
+    ADMIN_USER_TTL_SEC=3600,
+    DUMP_AGENT_MESSAGES=False,
+    EXCLUDED_AGENT_IDS=frozenset({"agent-excluded"}),
+)
 
 # Insert mock before any imports
 sys.modules['config'] = mock_config
@@ -10,41 +10,89 @@ It also sends new messages as episodes to Graphiti for knowledge graph integrati
 
 import logging
 import os
+import re
 import sys
+import threading
+import time
 import json
+import orjson
 import requests
 import asyncio
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
-from dotenv import load_dotenv
-from config import init_graphiti
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from config import init_graphiti, settings
 
 # Logger configuration
-# import logging # logging is imported via graphiti_core or other dependencies implicitly, or should be added if not
-# Ensure os and sys are imported if not already (they are: os on L11, sys on L12)
 logging.basicConfig(
-    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    level=settings.LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout # Explicitly stream to stdout for containerized environments
+    stream=sys.stdout, # Explicitly stream to stdout for containerized environments
+    force=True # config.py configures logging first at import; replace its stderr handler
 )
 logger = logging.getLogger(__name__)
 # Define the path to the state file in the mounted volume
 STATE_FILE_PATH = "/app/state/polling_state.json"
+# Polling state as last loaded from disk, used to skip no-op saves
+_ORIGINAL_STATE: Optional[Dict[str, str]] = None
+
+# Admin users rarely change, so the user map is cached on disk between runs
+ADMIN_USERS_CACHE_PATH = "/app/state/admin_users.json"
+
+# Set once a non-JSON Content-Type has been logged, so the warning is not repeated
+_warned_content_type = False
+
+# Agent and identity details are cached in memory for this many seconds
+DETAILS_CACHE_TTL_SEC = 300
+
+# ETags from Letta list responses, keyed by request URL, so unchanged pages
+# come back as 304 with no body. Persisted next to the polling state.
+ETAG_CACHE_PATH = "/app/state/etag_cache.json"
+_etag_cache: Dict[str, Dict[str, Any]] = {}
+# ETag cache as last loaded from disk, used to skip no-op saves
+_ORIGINAL_ETAG_CACHE: Dict[str, Dict[str, Any]] = {}
+
+# Shared HTTP session for all Letta API calls. Reusing one session keeps
+# connections alive between requests instead of paying a TCP+TLS handshake
+# per call, and the adapter retries transient gateway errors. The pool is
+# never smaller than the number of worker threads so no connection is
+# discarded after use.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=max(32, settings.POLL_CONCURRENCY),
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Field projections for list endpoints. Only these fields are used
+# downstream; servers that ignore the param simply return full objects.
+AGENT_FIELDS = 'id,name,description'
+USER_FIELDS = 'id,name'
 
 # Define message types to process
-ALLOWED_MESSAGE_TYPES = {"reasoning_message", "assistant_message", "user_message"}
-SKIPPED_MESSAGE_TYPES = {"tool_return_message"}
+ALLOWED_MESSAGE_TYPES = frozenset({"reasoning_message", "assistant_message", "user_message"})
+SKIPPED_MESSAGE_TYPES = frozenset({"tool_return_message"})
 
 # Agents to exclude from Graphiti ingestion (e.g., sleeptime agents, system agents)
+# are listed by ID in settings.EXCLUDED_AGENT_IDS (GRAPHITI_EXCLUDED_AGENT_IDS).
 # These agents' conversations will not be sent to the knowledge graph
-EXCLUDED_AGENT_IDS = set(os.getenv('GRAPHITI_EXCLUDED_AGENT_IDS', '').split(','))
-EXCLUDED_AGENT_IDS.discard('')  # Remove empty string if env var is empty
 
 # Agent name patterns to exclude (case-insensitive partial match)
 EXCLUDED_AGENT_NAME_PATTERNS = [
     'sleeptime',  # Sleeptime memory agents
     '-sleeptime',  # Agents ending with -sleeptime
 ]
+# Patterns are constant, so lowercase them once and match them all in a single regex scan
+_EXCLUDED_PATTERNS_LOWER = tuple(pattern.lower() for pattern in EXCLUDED_AGENT_NAME_PATTERNS)
+# An empty alternation would compile to re.compile('') and match every name, so leave it unset
+_EXCLUDED_NAME_RE = (
+    re.compile('|'.join(map(re.escape, _EXCLUDED_PATTERNS_LOWER))) if _EXCLUDED_PATTERNS_LOWER else None
+)
 
 
 def should_exclude_agent(agent_id: str, agent_name: str) -> bool:
@@ -58,45 +106,27 @@ def should_exclude_agent(agent_id: str, agent_name: str) -> bool:
     Returns:
         True if the agent should be excluded, False otherwise
     """
-    # Check if agent ID is explicitly excluded
-    if agent_id in EXCLUDED_AGENT_IDS:
+    if agent_id in settings.EXCLUDED_AGENT_IDS:
         return True
-
-    # Check if agent name matches any exclusion patterns
-    agent_name_lower = agent_name.lower()
-    for pattern in EXCLUDED_AGENT_NAME_PATTERNS:
-        if pattern.lower() in agent_name_lower:
-            return True
-
-    return False
+    return _EXCLUDED_NAME_RE is not None and bool(_EXCLUDED_NAME_RE.search(agent_name.lower()))
 
 
 def load_config() -> Dict[str, str]:
     """
-    Load configuration from environment variables.
+    Load configuration from the shared settings snapshot.
     
     Returns:
         Dict[str, str]: Configuration dictionary with API base URL and password
     """
-    # Load environment variables from .env file if it exists
-    load_dotenv()
-    
-    # Get required environment variables
-    base_url = os.getenv('LETTA_BASE_URL')
-    password = os.getenv('LETTA_PASSWORD')
-    
     # Validate required environment variables
-    if not base_url:
+    if not settings.LETTA_BASE_URL:
         sys.exit("Error: Missing required environment variable: LETTA_BASE_URL")
-    if not password:
+    if not settings.LETTA_PASSWORD:
         sys.exit("Error: Missing required environment variable: LETTA_PASSWORD")
     
-    # Construct the full API base URL
-    api_url_base = f"{base_url}/v1"
-    
     return {
-        'api_url_base': api_url_base,
-        'password': password
+        'api_url_base': f"{settings.LETTA_BASE_URL}/v1",
+        'password': settings.LETTA_PASSWORD
     }
 
 def get_auth_headers(password: str) -> Dict[str, str]:
@@ -116,13 +146,75 @@ def get_auth_headers(password: str) -> Dict[str, str]:
         'Authorization': f"Bearer {password}"
     }
 
-def list_all_agents(api_url_base: str, headers: Dict[str, str]) -> List[Dict[str, Any]]:
+def parse_json_response(response: requests.Response) -> Any:
+    """
+    Parse a Letta API response body as UTF-8 JSON.
+    
+    orjson reads the raw bytes directly, skipping the charset detection
+    that requests' Response.json() runs. The Letta API serves UTF-8 JSON;
+    a different Content-Type is logged once in case that ever changes.
+    
+    Args:
+        response (requests.Response): The HTTP response
+        
+    Returns:
+        Any: The parsed JSON body
+        
+    Raises:
+        orjson.JSONDecodeError: If the body is not valid JSON
+    """
+    global _warned_content_type
+    if not _warned_content_type:
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('application/json'):
+            logger.warning(f"Unexpected Content-Type from Letta API: {content_type!r}, parsing as UTF-8 JSON")
+            _warned_content_type = True
+    return orjson.loads(response.content)
+
+def conditional_get_json(
+    endpoint: str,
+    params: Dict[str, Any],
+    cache_body: bool
+) -> Any:
+    """
+    GET a JSON resource, sending If-None-Match when an ETag is cached for the URL.
+    
+    Args:
+        endpoint (str): The URL to fetch
+        params (Dict[str, Any]): Query parameters
+        cache_body (bool): Cache every response body with its ETag; when False
+            only empty responses are cached, so a 304 always means "empty"
+        
+    Returns:
+        Any: The parsed JSON body, or the cached body on 304 Not Modified
+        
+    Raises:
+        requests.exceptions.RequestException: On HTTP errors
+        orjson.JSONDecodeError: If the body is not valid JSON
+    """
+    url = requests.Request('GET', endpoint, params=params).prepare().url
+    entry = _etag_cache.get(url)
+    headers = {'If-None-Match': entry['etag']} if entry else None
+
+    response = SESSION.get(endpoint, headers=headers, params=params)
+    if entry and response.status_code == 304:
+        return entry['body']
+    response.raise_for_status()
+
+    data = parse_json_response(response)
+    etag = response.headers.get('ETag')
+    if etag and (cache_body or not data):
+        _etag_cache[url] = {'etag': etag, 'body': data}
+    else:
+        _etag_cache.pop(url, None)
+    return data
+
+def list_all_agents(api_url_base: str) -> List[Dict[str, Any]]:
     """
     Retrieve all agents from the Letta API with pagination handling.
     
     Args:
         api_url_base (str): The base URL for the Letta API
-        headers (Dict[str, str]): Authentication headers
         
     Returns:
         List[Dict[str, Any]]: List of all agent objects
@@ -132,17 +224,14 @@ def list_all_agents(api_url_base: str, headers: Dict[str, str]) -> List[Dict[str
     
     # Initial parameters
     params = {
-        'limit': 100  # Request a larger batch size to minimize API calls
+        'limit': 100,  # Request a larger batch size to minimize API calls
+        'fields': AGENT_FIELDS,
     }
     
     while True:
         try:
-            # Make the API request
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            
-            # Parse the response
-            agents_batch = response.json()
+            # Make the API request, reusing the cached page if it is unchanged
+            agents_batch = conditional_get_json(endpoint, params, cache_body=True)
             
             # Check if we got any agents
             if not agents_batch:
@@ -159,160 +248,240 @@ def list_all_agents(api_url_base: str, headers: Dict[str, str]) -> List[Dict[str
             # Use the ID of the last agent in the current batch
             params['after'] = agents_batch[-1]['id']
             
-        except requests.exceptions.RequestException as e:
-            print(f"Error retrieving agents: {e}")
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.error(f"Error retrieving agents: {e}")
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Response status code: {e.response.status_code}")
-                print(f"Response body: {e.response.text}")
+                logger.error(f"Response status code: {e.response.status_code}")
+                logger.error(f"Response body: {e.response.text}")
             sys.exit(1)
     
     return all_agents
 
-def get_agent_details(agent_id: str, api_url_base: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+@cached(
+    cache=TTLCache(maxsize=1024, ttl=DETAILS_CACHE_TTL_SEC),
+    key=lambda agent_id, api_url_base: hashkey(agent_id, api_url_base),
+    lock=threading.Lock(),
+)
+def _fetch_agent_details(agent_id: str, api_url_base: str) -> Dict[str, Any]:
+    """
+    Fetch agent details, caching successful responses by ID.
+    Errors propagate, so failures are never cached.
+    """
+    endpoint = f"{api_url_base}/agents/{agent_id}"
+    logger.info(f"Fetching agent details for agent ID: {agent_id}")
+    response = SESSION.get(endpoint)
+    response.raise_for_status()
+    agent_data = parse_json_response(response)
+    logger.info(f"Successfully retrieved details for agent {agent_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Agent details: %s...", json.dumps(agent_data, default=str)[:500])
+    return agent_data
+
+def get_agent_details(agent_id: str, api_url_base: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve details for a specific agent from the Letta API.
+    Successful lookups are cached for DETAILS_CACHE_TTL_SEC seconds.
     
     Args:
         agent_id (str): The ID of the agent
         api_url_base (str): The base URL for the Letta API
-        headers (Dict[str, str]): Authentication headers
         
     Returns:
         Optional[Dict[str, Any]]: Agent details dictionary or None if an error occurs
     """
-    endpoint = f"{api_url_base}/agents/{agent_id}"
     try:
-        logger.info(f"Fetching agent details for agent ID: {agent_id}")
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        agent_data = response.json()
-        logger.info(f"Successfully retrieved details for agent {agent_id}")
-        logger.debug(f"Agent details: {json.dumps(agent_data, default=str)[:500]}...")
-        return agent_data
-    except requests.exceptions.RequestException as e:
+        return _fetch_agent_details(agent_id, api_url_base)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.error(f"Error retrieving details for agent {agent_id}: {e}")
         if hasattr(e, 'response') and e.response is not None:
             logger.error(f"Response status code: {e.response.status_code}")
             logger.error(f"Response body: {e.response.text}")
         return None
 
-def get_admin_users(api_url_base: str, headers: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+def load_cached_admin_users() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Load the admin user map from the on-disk cache if it is still fresh.
+    
+    Returns:
+        Optional[Dict[str, Dict[str, Any]]]: The cached user map, or None if the
+        cache is missing, older than ADMIN_USER_TTL_SEC, or unreadable
+    """
+    try:
+        age = time.time() - os.path.getmtime(ADMIN_USERS_CACHE_PATH)
+        if age >= settings.ADMIN_USER_TTL_SEC:
+            return None
+        with open(ADMIN_USERS_CACHE_PATH, 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading admin user cache {ADMIN_USERS_CACHE_PATH}: {e}")
+        return None
+
+def get_admin_users(api_url_base: str) -> Dict[str, Dict[str, Any]]:
     """
     Retrieve all admin users from the Letta API.
     This is used to map user IDs in messages to actual user names.
+    The map is served from the on-disk cache while it is younger than
+    ADMIN_USER_TTL_SEC, and the cache is refreshed after each fetch.
     
     Args:
         api_url_base (str): The base URL for the Letta API
-        headers (Dict[str, str]): Authentication headers
         
     Returns:
         Dict[str, Dict[str, Any]]: Dictionary mapping user IDs to user data (e.g., {'id': 'user_uuid', 'name': 'User Name'})
     """
+    cached_map = load_cached_admin_users()
+    if cached_map is not None:
+        logger.info(f"Using {len(cached_map)} cached users from {ADMIN_USERS_CACHE_PATH}")
+        return cached_map
+
     endpoint = f"{api_url_base}/admin/users/"
     user_map = {}
     try:
-        response = requests.get(endpoint, headers=headers)
+        response = SESSION.get(endpoint, params={'fields': USER_FIELDS})
         response.raise_for_status()
-        users = response.json()
+        users = parse_json_response(response)
         if isinstance(users, list):
             for user_data in users:
                 if isinstance(user_data, dict) and 'id' in user_data:
                     user_map[user_data['id']] = user_data
-            print(f"Successfully fetched {len(user_map)} users from /admin/users/")
+            logger.info(f"Successfully fetched {len(user_map)} users from /admin/users/")
+            if user_map:
+                try:
+                    write_json_atomic(ADMIN_USERS_CACHE_PATH, user_map)
+                except Exception as e:
+                    logger.error(f"Error caching admin users to {ADMIN_USERS_CACHE_PATH}: {e}")
         else:
-            print(f"Warning: Expected a list from /admin/users/, got {type(users)}. Response: {users}")
+            logger.warning(f"Expected a list from /admin/users/, got {type(users)}. Response: {users}")
     except requests.exceptions.RequestException as e:
-        print(f"Error retrieving admin users: {e}")
+        logger.error(f"Error retrieving admin users: {e}")
         if hasattr(e, 'response') and e.response is not None:
-            print(f"Response status code: {e.response.status_code}")
-            print(f"Response body: {e.response.text}")
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from /admin/users/: {e}")
+            logger.error(f"Response status code: {e.response.status_code}")
+            logger.error(f"Response body: {e.response.text}")
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Error decoding JSON from /admin/users/: {e}")
     return user_map
 
-def get_identity_details(identity_id: str, api_url_base: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+@cached(
+    cache=TTLCache(maxsize=1024, ttl=DETAILS_CACHE_TTL_SEC),
+    key=lambda identity_id, api_url_base: hashkey(identity_id, api_url_base),
+    lock=threading.Lock(),
+)
+def _fetch_identity_details(identity_id: str, api_url_base: str) -> Dict[str, Any]:
+    """
+    Fetch identity details, caching successful responses by ID.
+    Errors propagate, so failures are never cached.
+    """
+    endpoint = f"{api_url_base}/identities/{identity_id}"
+    logger.info(f"Fetching identity details for identity ID: {identity_id}")
+    response = SESSION.get(endpoint)
+    response.raise_for_status()
+    identity_data = parse_json_response(response)
+    logger.info(f"Successfully retrieved details for identity {identity_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Identity details: %s...", json.dumps(identity_data, default=str)[:500])
+    return identity_data
+
+def get_identity_details(identity_id: str, api_url_base: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve details for a specific identity from the Letta API.
+    Successful lookups are cached for DETAILS_CACHE_TTL_SEC seconds.
     
     Args:
         identity_id (str): The ID of the identity
         api_url_base (str): The base URL for the Letta API
-        headers (Dict[str, str]): Authentication headers
         
     Returns:
         Optional[Dict[str, Any]]: Identity details dictionary or None if an error occurs
     """
-    endpoint = f"{api_url_base}/identities/{identity_id}"
     try:
-        logger.info(f"Fetching identity details for identity ID: {identity_id}")
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        identity_data = response.json()
-        logger.info(f"Successfully retrieved details for identity {identity_id}")
-        logger.debug(f"Identity details: {json.dumps(identity_data, default=str)[:500]}...")
-        return identity_data
-    except requests.exceptions.RequestException as e:
+        return _fetch_identity_details(identity_id, api_url_base)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.error(f"Error retrieving details for identity {identity_id}: {e}")
         if hasattr(e, 'response') and e.response is not None:
             logger.error(f"Response status code: {e.response.status_code}")
             logger.error(f"Response body: {e.response.text}")
         return None
 
+def write_json_atomic(path: str, data: Any) -> None:
+    """
+    Write data as JSON to a temporary file and atomically move it into place,
+    so a crash mid-write never leaves a truncated file behind.
+    
+    Args:
+        path (str): Destination file path
+        data (Any): JSON-serializable data to write
+    """
+    # Create the directory if it doesn't exist
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 def load_polling_state() -> Dict[str, str]:
     """
     Load the polling state from the state file in the mounted volume.
+    A copy of the loaded state is kept so unchanged state is not rewritten.
     
     Returns:
         Dict[str, str]: Dictionary mapping agent IDs to their last processed message IDs
     """
+    global _ORIGINAL_STATE
     try:
         if os.path.exists(STATE_FILE_PATH):
-            with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(STATE_FILE_PATH, 'rb') as f:
+                state = orjson.loads(f.read())
         else:
-            print(f"State file {STATE_FILE_PATH} not found. Starting with empty state.")
-            return {}
+            logger.info(f"State file {STATE_FILE_PATH} not found. Starting with empty state.")
+            state = {}
     except Exception as e:
-        print(f"Error loading state file {STATE_FILE_PATH}: {e}")
-        return {}
+        logger.error(f"Error loading state file {STATE_FILE_PATH}: {e}")
+        state = {}
+    _ORIGINAL_STATE = dict(state)
+    return state
 
 def save_polling_state(state: Dict[str, str]) -> None:
     """
     Save the polling state to the state file in the mounted volume.
+    The file is written atomically via write_json_atomic, and nothing is
+    written if the state is unchanged since it was loaded.
     
     Args:
         state (Dict[str, str]): Dictionary mapping agent IDs to their last processed message IDs
     """
+    if state == _ORIGINAL_STATE:
+        logger.info("Polling state unchanged, skipping save.")
+        return
+
     try:
-        # Create the directory if it doesn't exist
-        os.makedirs(os.path.dirname(STATE_FILE_PATH), exist_ok=True)
-        
-        with open(STATE_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(state, f, indent=4)
-        print(f"Updated polling state saved to {STATE_FILE_PATH}")
+        write_json_atomic(STATE_FILE_PATH, state)
+        logger.info(f"Updated polling state saved to {STATE_FILE_PATH}")
     except Exception as e:
-        print(f"Error saving state to {STATE_FILE_PATH}: {e}")
+        logger.error(f"Error saving state to {STATE_FILE_PATH}: {e}")
 
-def fetch_new_messages_for_agent(
+def iter_new_messages_for_agent(
     agent_id: str, 
     api_url_base: str, 
-    headers: Dict[str, str], 
     last_message_id: Optional[str] = None
-) -> List[Dict[str, Any]]:
+) -> Iterator[Dict[str, Any]]:
     """
-    Retrieve new messages for a specific agent from the Letta API with pagination handling.
+    Yield new messages for a specific agent from the Letta API with pagination handling.
+    Pages are fetched lazily, so only one page is held in memory at a time.
     
     Args:
         agent_id (str): The ID of the agent to fetch messages for
         api_url_base (str): The base URL for the Letta API
-        headers (Dict[str, str]): Authentication headers
         last_message_id (Optional[str]): The ID of the last processed message
         
-    Returns:
-        List[Dict[str, Any]]: List of new message objects for the agent
+    Yields:
+        Dict[str, Any]: New message objects for the agent, oldest first
     """
     endpoint = f"{api_url_base}/agents/{agent_id}/messages"
-    new_messages = []
     
     # Pagination strategy
     #
@@ -334,39 +503,78 @@ def fetch_new_messages_for_agent(
 
     while True:
         try:
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
-
-            messages_batch = response.json()
-
-            if not messages_batch:
-                break
+            # Only empty pages are cached, so a 304 means there is still nothing new
+            messages_batch = conditional_get_json(endpoint, params, cache_body=False)
 
-            new_messages.extend(messages_batch)
-
-            if len(messages_batch) < params['limit']:
-                break
-
-            # Continue paging forward in chronological order
-            params['after'] = messages_batch[-1]['id']
-
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             # Handle 404 errors specially - the stored message ID may have been deleted
             if hasattr(e, 'response') and e.response is not None and e.response.status_code == 404:
                 if 'after' in params and not tried_without_after:
                     tried_without_after = True
-                    print(
+                    logger.warning(
                         f"  Message ID {params['after']} not found (404), trying without 'after' param to reset state"
                     )
                     del params['after']
                     continue
-            print(f"Error retrieving messages for agent {agent_id}: {e}")
+            logger.error(f"Error retrieving messages for agent {agent_id}: {e}")
             if hasattr(e, 'response') and e.response is not None:
-                print(f"Response status code: {e.response.status_code}")
-                print(f"Response body: {e.response.text}")
-            return []
+                logger.error(f"Response status code: {e.response.status_code}")
+                logger.error(f"Response body: {e.response.text}")
+            return
 
-    return new_messages
+        if not messages_batch:
+            break
+
+        yield from messages_batch
+
+        if len(messages_batch) < params['limit']:
+            break
+
+        # Continue paging forward in chronological order
+        params['after'] = messages_batch[-1]['id']
+
+def load_etag_cache() -> None:
+    """
+    Load the persisted ETag cache so conditional requests survive restarts.
+    """
+    global _etag_cache, _ORIGINAL_ETAG_CACHE
+    try:
+        with open(ETAG_CACHE_PATH, 'rb') as f:
+            _etag_cache = orjson.loads(f.read())
+    except FileNotFoundError:
+        _etag_cache = {}
+    except Exception as e:
+        logger.error(f"Error loading ETag cache {ETAG_CACHE_PATH}: {e}")
+        _etag_cache = {}
+    _ORIGINAL_ETAG_CACHE = dict(_etag_cache)
+
+# Message-page cache keys embed the agent ID in the request URL
+_MESSAGES_URL_AGENT_RE = re.compile(r'/agents/([^/?]+)/messages')
+
+def prune_etag_cache(agent_ids: Iterable[str]) -> None:
+    """
+    Drop cached message pages for agents that are no longer polled, so the cache
+    does not grow with every agent that has ever existed.
+
+    Args:
+        agent_ids: IDs of the agents polled this run
+    """
+    agent_ids = set(agent_ids)
+    for url in list(_etag_cache):
+        match = _MESSAGES_URL_AGENT_RE.search(url)
+        if match and match.group(1) not in agent_ids:
+            del _etag_cache[url]
+
+def save_etag_cache() -> None:
+    """
+    Persist the ETag cache if it changed during this run.
+    """
+    if _etag_cache == _ORIGINAL_ETAG_CACHE:
+        return
+    try:
+        write_json_atomic(ETAG_CACHE_PATH, _etag_cache)
+    except Exception as e:
+        logger.error(f"Error saving ETag cache to {ETAG_CACHE_PATH}: {e}")
 
 def summarize_agent(agent: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -384,6 +592,31 @@ def summarize_agent(agent: Dict[str, Any]) -> Dict[str, Any]:
         'description': agent.get('description', '')
     }
 
+def _extract_text(content_data: Any) -> str:
+    """
+    Extract plain text from a Letta message content field.
+    
+    Args:
+        content_data: A list of content parts, a dict, or a plain value
+        
+    Returns:
+        str: The text parts joined with spaces, the dict's 'text' (or the dict
+        serialized as JSON when it has none), or the value as a string
+    """
+    if isinstance(content_data, list):
+        # Parts are dicts in practice, so skip the per-part isinstance check and
+        # only fall back to it if a non-dict part turns up
+        try:
+            return ' '.join([part.get('text', '') for part in content_data if part.get('type') == 'text'])
+        except AttributeError:
+            return ' '.join([part.get('text', '') for part in content_data
+                             if isinstance(part, dict) and part.get('type') == 'text'])
+    if isinstance(content_data, dict):
+        if 'text' in content_data:
+            return content_data['text']
+        return orjson.dumps(content_data).decode()
+    return str(content_data)
+
 def format_message_for_graphiti(
     message_obj: Dict[str, Any],
     admin_user_map: Optional[Dict[str, Dict[str, Any]]] = None
@@ -433,15 +666,7 @@ def format_message_for_graphiti(
     
     if message_type == 'user_message':
         role = "user"
-        content_data = message_obj.get('content', '')
-        if isinstance(content_data, list):
-            text_parts = [part.get('text', '') for part in content_data 
-                         if isinstance(part, dict) and part.get('type') == 'text']
-            content = ' '.join(text_parts)
-        elif isinstance(content_data, dict):
-            content = content_data.get('text', json.dumps(content_data))
-        else:
-            content = str(content_data)
+        content = _extract_text(message_obj.get('content', ''))
             
         # Get user name from admin map
         if message_api_user_id and admin_user_map and message_api_user_id in admin_user_map:
@@ -453,22 +678,14 @@ def format_message_for_graphiti(
             
     elif message_type == 'assistant_message':
         role = "assistant"
-        content_data = message_obj.get('content', '')
-        if isinstance(content_data, list):
-            text_parts = [part.get('text', '') for part in content_data 
-                         if isinstance(part, dict) and part.get('type') == 'text']
-            content = ' '.join(text_parts)
-        elif isinstance(content_data, dict):
-            content = content_data.get('text', json.dumps(content_data))
-        else:
-            content = str(content_data)
+        content = _extract_text(message_obj.get('content', ''))
         role_name = "Agent"
         
     elif message_type == 'reasoning_message':
         role = "system"
         reasoning_data = message_obj.get('reasoning', '')
         if isinstance(reasoning_data, (dict, list)):
-            content = json.dumps(reasoning_data)
+            content = orjson.dumps(reasoning_data).decode()
         else:
             content = str(reasoning_data)
         role_name = "Agent (Reasoning)"
@@ -495,125 +712,192 @@ def format_message_for_graphiti(
 
 async def main():
     """Main function to execute the script."""
-    print("Polling for new messages from Letta agents...")
+    logger.info("Polling for new messages from Letta agents...")
     
     # Load configuration
     config = load_config()
     
-    # Get authentication headers
-    headers = get_auth_headers(config['password'])
+    # Attach authentication headers to the shared session once
+    SESSION.headers.update(get_auth_headers(config['password']))
     
     # Load the polling state
     polling_state = load_polling_state()
+    load_etag_cache()
     
     # Initialize Graphiti HTTP client
     try:
         graphiti = init_graphiti()
-        print("Successfully connected to Graphiti")
+        logger.info("Successfully connected to Graphiti")
     except Exception as e:
-        print(f"Error connecting to Graphiti: {e}")
+        logger.error(f"Error connecting to Graphiti: {e}")
         return
 
     # Fetch admin users for name mapping
-    print("Fetching admin user map...")
+    logger.info("Fetching admin user map...")
     admin_user_map = await asyncio.to_thread(
-        get_admin_users, config['api_url_base'], headers
+        get_admin_users, config['api_url_base']
     )
     if not admin_user_map:
-        print("Warning: Admin user map is empty. User names might not be resolved.")
+        logger.warning("Admin user map is empty. User names might not be resolved.")
     
     # Retrieve all agents
-    print("Fetching all agents...")
+    logger.info("Fetching all agents...")
     agents = await asyncio.to_thread(
-        list_all_agents, config['api_url_base'], headers
+        list_all_agents, config['api_url_base']
     )
+
+    # Drop agents excluded from Graphiti ingestion up front so only real work is polled
+    total_agent_count = len(agents)
+    agents = [agent for agent in agents if not should_exclude_agent(agent['id'], agent.get('name', ''))]
+    if len(agents) < total_agent_count:
+        logger.info(f"Skipping {total_agent_count - len(agents)} excluded agents")
     
     all_agents_data = {}
-    
-    for i, agent_summary in enumerate(agents, 1):
+    # Raw messages are only kept in memory when they are going to be dumped
+    dump_messages = settings.DUMP_AGENT_MESSAGES
+
+    # Poll agents concurrently; the work is dominated by HTTP latency, so a
+    # bounded number of in-flight agents keeps the Letta server from being
+    # flooded while still overlapping round-trips.
+    sem = asyncio.Semaphore(settings.POLL_CONCURRENCY)
+
+    async def poll_one(
+        i: int, agent_summary: Dict[str, Any]
+    ) -> Tuple[str, Dict[str, Any], Optional[str], List[Dict[str, Any]]]:
+        """Poll a single agent and return (agent_id, agent_data, newest_message_id, graphiti_messages)."""
         agent_id = agent_summary['id']
         agent_name = agent_summary.get('name', 'Unnamed Agent')
 
-        # Check if agent should be excluded from Graphiti ingestion
-        if should_exclude_agent(agent_id, agent_name):
-            print(f"\nSkipping excluded agent {i}/{len(agents)}: {agent_name} (ID: {agent_id})")
-            continue
+        async with sem:
+            logger.info(f"Polling for agent {i}/{len(agents)}: {agent_name} (ID: {agent_id}).")
+            last_message_id_for_agent = polling_state.get(agent_id)
+            if last_message_id_for_agent:
+                logger.info(f"Last known message ID for {agent_name} was: {last_message_id_for_agent} (for reference).")
+            else:
+                logger.info(f"No prior polling state for agent {agent_name}.")
 
-        print(f"\nPolling for agent {i}/{len(agents)}: {agent_name} (ID: {agent_id}).")
-        last_message_id_for_agent = polling_state.get(agent_id)
-        if last_message_id_for_agent:
-            print(f"Last known message ID for {agent_name} was: {last_message_id_for_agent} (for reference).")
-        else:
-            print(f"No prior polling state for agent {agent_name}.")
-
-        fetched_messages = await asyncio.to_thread(
-            fetch_new_messages_for_agent,
-            agent_id,
-            config['api_url_base'],
-            headers,
-            last_message_id_for_agent
-        )
-        
-        processed_messages_for_agent = []
-        if fetched_messages:
-            print(f"Found {len(fetched_messages)} messages for agent {agent_name}.")
-            
-            # Format messages for Graphiti HTTP API
-            graphiti_messages = []
-            newest_message_id_in_batch = None
-            
-            for msg in fetched_messages:
-                # Skip messages we've already processed (prevents duplicate ingestion when fallback is used)
-                if last_message_id_for_agent and msg['id'] == last_message_id_for_agent:
-                    print(f"  Skipping already processed Message ID: {msg['id']}")
-                    continue
+            def collect_messages() -> Tuple[int, Optional[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+                """
+                Consume the message pages for this agent in a worker thread.
+
+                Returns (fetched_count, last_seen_id, graphiti_messages, processed_messages).
+                """
+                fetched_count = 0
+                last_seen_id = None
+                # Format messages for Graphiti HTTP API
+                graphiti_messages = []
+                processed_messages = []
+                for msg in iter_new_messages_for_agent(
+                    agent_id,
+                    config['api_url_base'],
+                    last_message_id_for_agent
+                ):
+                    fetched_count += 1
+                    # Messages are fetched in ascending order, so the last one seen is the newest
+                    last_seen_id = msg['id']
 
-                print(f"  Processing Message ID: {msg['id']}, Type: {msg.get('type') or msg.get('message_type')}")
-                
-                formatted_msg = format_message_for_graphiti(msg, admin_user_map)
-                if formatted_msg:
-                    graphiti_messages.append(formatted_msg)
-                    processed_messages_for_agent.append(msg)
-                    
-                if newest_message_id_in_batch is None or msg['id'] > newest_message_id_in_batch:
-                    newest_message_id_in_batch = msg['id']
-            
-            # Send all messages to Graphiti in one HTTP call
-            if graphiti_messages:
-                success = graphiti.add_messages(agent_id, graphiti_messages)
-                if success:
-                    print(f"Successfully sent {len(graphiti_messages)} messages to Graphiti for agent {agent_name}")
-                else:
-                    print(f"Failed to send messages to Graphiti for agent {agent_name}")
-
-            if newest_message_id_in_batch:
-                polling_state[agent_id] = newest_message_id_in_batch
-                print(f"Updating last message ID for agent {agent_name} to {newest_message_id_in_batch}.")
-        else:
-            print(f"No new messages found for agent {agent_name}.")
-        
-        all_agents_data[agent_id] = {
+                    # Skip messages we've already processed (prevents duplicate ingestion when fallback is used)
+                    if last_message_id_for_agent and msg['id'] == last_message_id_for_agent:
+                        logger.info(f"  Skipping already processed Message ID: {msg['id']}")
+                        continue
+
+                    logger.info(f"  Processing Message ID: {msg['id']}, Type: {msg.get('type') or msg.get('message_type')}")
+
+                    formatted_msg = format_message_for_graphiti(msg, admin_user_map)
+                    if formatted_msg:
+                        graphiti_messages.append(formatted_msg)
+                        if dump_messages:
+                            processed_messages.append(msg)
+                return fetched_count, last_seen_id, graphiti_messages, processed_messages
+
+            (
+                fetched_count,
+                newest_message_id_in_batch,
+                graphiti_messages,
+                processed_messages_for_agent,
+            ) = await asyncio.to_thread(collect_messages)
+
+            if fetched_count:
+                logger.info(f"Found {fetched_count} messages for agent {agent_name}.")
+            else:
+                logger.info(f"No new messages found for agent {agent_name}.")
+
+        agent_data = {
             'name': agent_name,
             'description': agent_summary.get('description', ''),
-            'processed_messages_this_run': processed_messages_for_agent
+            'processed_message_count': len(graphiti_messages),
         }
-    
+        if dump_messages:
+            agent_data['processed_messages_this_run'] = processed_messages_for_agent
+        return agent_id, agent_data, newest_message_id_in_batch, graphiti_messages
+
+    results = await asyncio.gather(
+        *[poll_one(i, agent_summary) for i, agent_summary in enumerate(agents, 1)],
+        return_exceptions=True
+    )
+
+    def advance_cursor(agent_id: str, newest_message_id: str) -> None:
+        polling_state[agent_id] = newest_message_id
+        logger.info(f"Updating last message ID for agent {all_agents_data[agent_id]['name']} to {newest_message_id}.")
+
+    # Apply state updates after all agents finish so the shared dicts are
+    # only mutated from one place. An agent with messages to send keeps its
+    # old cursor until Graphiti accepts them, so a failed send is retried
+    # on the next run instead of being skipped.
+    pending: Dict[str, List[Dict[str, Any]]] = {}
+    pending_cursors: Dict[str, str] = {}
+    for agent_summary, result in zip(agents, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error polling agent {agent_summary['id']}: {result}")
+            continue
+        agent_id, agent_data, newest_message_id, graphiti_messages = result
+        all_agents_data[agent_id] = agent_data
+        if graphiti_messages:
+            pending[agent_id] = graphiti_messages
+            pending_cursors[agent_id] = newest_message_id
+        elif newest_message_id:
+            advance_cursor(agent_id, newest_message_id)
+
+    # Flush all agents' messages to Graphiti at once, one HTTP call per agent
+    # pipelined over the Graphiti session's keep-alive connections
+    async def send_one(agent_id: str, graphiti_messages: List[Dict[str, Any]]) -> bool:
+        async with sem:
+            return await asyncio.to_thread(graphiti.add_messages, agent_id, graphiti_messages)
+
+    send_results = await asyncio.gather(
+        *[send_one(agent_id, graphiti_messages) for agent_id, graphiti_messages in pending.items()],
+        return_exceptions=True
+    )
+    for (agent_id, graphiti_messages), success in zip(pending.items(), send_results):
+        agent_name = all_agents_data[agent_id]['name']
+        if isinstance(success, Exception):
+            logger.error(f"Error sending messages to Graphiti for agent {agent_name}: {success}")
+        elif success is True:
+            logger.info(f"Successfully sent {len(graphiti_messages)} messages to Graphiti for agent {agent_name}")
+            advance_cursor(agent_id, pending_cursors[agent_id])
+        else:
+            logger.error(f"Failed to send messages to Graphiti for agent {agent_name}")
+
     # Save the updated polling state
     save_polling_state(polling_state)
+    prune_etag_cache(agent['id'] for agent in agents)
+    save_etag_cache()
     
-    # Save all data to a JSON file (optional, can be removed if not needed)
-    output_file = 'all_agent_messages.json'
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(all_agents_data, f, indent=4)
-        print(f"\nSaved all agent data and new messages to {output_file}")
-    except Exception as e:
-        print(f"Error saving data to {output_file}: {e}")
+    # Dump processed messages for debugging, one JSON object per agent per line
+    if dump_messages:
+        output_file = 'all_agent_messages.jsonl'
+        try:
+            with open(output_file, 'wb') as f:
+                for agent_id, agent_data in all_agents_data.items():
+                    f.write(orjson.dumps({agent_id: agent_data}) + b'\n')
+            logger.info(f"Saved all agent data and new messages to {output_file}")
+        except Exception as e:
+            logger.error(f"Error saving data to {output_file}: {e}")
     
     # Display summary
     total_agents = len(all_agents_data)
-    total_new_messages = sum(len(agent_data['processed_messages_this_run']) for agent_data in all_agents_data.values())
-    print(f"\nSummary: Processed {total_agents} agents with {total_new_messages} new messages.")
+    total_new_messages = sum(agent_data['processed_message_count'] for agent_data in all_agents_data.values())
+    logger.info(f"Summary: Processed {total_agents} agents with {total_new_messages} new messages.")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
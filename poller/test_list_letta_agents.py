@@ -9,27 +9,75 @@ These tests cover the core polling logic including:
 - Agent exclusion logic
 """
 
+import asyncio
+import os
+import orjson
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import patch, MagicMock
 import requests
+import responses
+from responses import matchers
+
+from list_letta_agents import (
+    ALLOWED_MESSAGE_TYPES,
+    SKIPPED_MESSAGE_TYPES,
+    format_message_for_graphiti,
+    get_admin_users,
+    get_agent_details,
+    iter_new_messages_for_agent,
+    list_all_agents,
+    main,
+    load_cached_admin_users,
+    load_etag_cache,
+    load_polling_state,
+    prune_etag_cache,
+    save_etag_cache,
+    save_polling_state,
+    should_exclude_agent,
+)
+
+
+@pytest.fixture(scope="module")
+def api_url_base():
+    return "http://localhost:8283/v1"
+
+
+@pytest.fixture(autouse=True)
+def empty_etag_cache(monkeypatch):
+    """Give every test a fresh ETag cache so conditional GETs don't leak between tests."""
+    monkeypatch.setattr("list_letta_agents._etag_cache", {})
 
 
 class TestShouldExcludeAgent:
     """Tests for the agent exclusion logic."""
 
-    def test_exclude_sleeptime_agent_by_name(self):
-        """Test that sleeptime agents are excluded by name pattern."""
-        from list_letta_agents import should_exclude_agent
-        assert should_exclude_agent("agent-123", "Meridian-sleeptime") is True
-        assert should_exclude_agent("agent-456", "sleeptime-agent") is True
-        assert should_exclude_agent("agent-789", "my-SLEEPTIME-agent") is True
-
-    def test_include_regular_agent(self):
-        """Test that regular agents are not excluded."""
-        from list_letta_agents import should_exclude_agent
-        assert should_exclude_agent("agent-123", "Meridian") is False
-        assert should_exclude_agent("agent-456", "BMO") is False
-        assert should_exclude_agent("agent-789", "GraphitiExplorer") is False
+    @pytest.mark.parametrize("agent_id,name,expected", [
+        # Sleeptime agents are excluded by name pattern, case-insensitively
+        ("agent-123", "Meridian-sleeptime", True),
+        ("agent-456", "sleeptime-agent", True),
+        ("agent-789", "my-SLEEPTIME-agent", True),
+        # Regular agents are not excluded
+        ("agent-123", "Meridian", False),
+        ("agent-456", "BMO", False),
+        ("agent-789", "GraphitiExplorer", False),
+        # Agents listed in settings.EXCLUDED_AGENT_IDS are excluded regardless of name
+        ("agent-excluded", "Meridian", True),
+    ])
+    def test_exclude(self, agent_id, name, expected):
+        """Test agent exclusion by name pattern and by ID."""
+        assert should_exclude_agent(agent_id, name) is expected
+
+    @pytest.mark.parametrize("agent_id,name,expected", [
+        # With no name patterns configured, nothing is excluded by name
+        ("agent-123", "Meridian-sleeptime", False),
+        ("agent-456", "Meridian", False),
+        # ...but the ID exclusion list still applies
+        ("agent-excluded", "Meridian", True),
+    ])
+    def test_exclude_without_name_patterns(self, monkeypatch, agent_id, name, expected):
+        """Test that an empty pattern list does not exclude every agent."""
+        monkeypatch.setattr("list_letta_agents._EXCLUDED_NAME_RE", None)
+        assert should_exclude_agent(agent_id, name) is expected
 
 
 class TestMessageTypeConstants:
@@ -37,193 +85,198 @@ class TestMessageTypeConstants:
 
     def test_allowed_message_types(self):
         """Verify allowed message types are correct."""
-        from list_letta_agents import ALLOWED_MESSAGE_TYPES
         assert "user_message" in ALLOWED_MESSAGE_TYPES
         assert "assistant_message" in ALLOWED_MESSAGE_TYPES
         assert "reasoning_message" in ALLOWED_MESSAGE_TYPES
 
     def test_skipped_message_types(self):
         """Verify skipped message types are correct."""
-        from list_letta_agents import SKIPPED_MESSAGE_TYPES
         assert "tool_return_message" in SKIPPED_MESSAGE_TYPES
 
 
-class TestFetchNewMessagesForAgent:
-    """Tests for the fetch_new_messages_for_agent function."""
-
-    @pytest.fixture
-    def mock_headers(self):
-        return {"Authorization": "Bearer test-password"}
-
-    @pytest.fixture
-    def api_url_base(self):
-        return "http://localhost:8283/v1"
-
-    def test_fetch_messages_no_prior_state(self, mock_headers, api_url_base):
-        """Test fetching messages when there's no prior polling state."""
-        from list_letta_agents import fetch_new_messages_for_agent
-
-        # Mock returns 1 message, then empty (simulating end of messages)
-        call_count = [0]
-
-        def mock_get_side_effect(*args, **kwargs):
-            call_count[0] += 1
-            response = Mock()
-            response.status_code = 200
-            response.raise_for_status = Mock()
-            if call_count[0] == 1:
-                response.json.return_value = [
-                    {"id": "message-001", "type": "user_message", "content": "Hello"},
-                ]
-            else:
-                response.json.return_value = []  # No more messages
-            return response
-
-        with patch("list_letta_agents.requests.get", side_effect=mock_get_side_effect) as mock_get:
-            messages = fetch_new_messages_for_agent(
-                agent_id="agent-123",
-                api_url_base=api_url_base,
-                headers=mock_headers,
-                last_message_id=None,
-            )
-
-            first_call_args = mock_get.call_args_list[0]
-            first_params = first_call_args.kwargs.get("params", {})
-
-            # No cursor on first call
-            assert "after" not in first_params
-            # Uses correct pagination direction
-            assert first_params.get("order") == "asc"
-
-            assert len(messages) == 1
-
-    def test_fetch_messages_with_prior_state(self, mock_headers, api_url_base):
+class TestIterNewMessagesForAgent:
+    """Tests for the iter_new_messages_for_agent function."""
+
+    @pytest.mark.parametrize("last_id,pages,expected_calls,expected_msgs", [
+        # No prior state: a short page is the last page
+        (None, [[{"id": "message-001", "type": "user_message", "content": "Hello"}]], 1, 1),
+        # Valid cursor, nothing new: an empty page means "no new messages", no fallback
+        ("message-stale", [[]], 1, 0),
+        # No prior state and no messages: doesn't retry infinitely
+        (None, [[]], 1, 0),
+        # A full page pages forward until a short/empty page
+        (None, [[{"id": f"message-{n:03}", "type": "user_message", "content": "Hi"} for n in range(100)], []], 2, 100),
+    ])
+    @responses.activate
+    def test_pagination_loop(self, api_url_base, last_id, pages, expected_calls, expected_msgs):
+        """Test when the pagination loop stops and which cursor it starts from."""
+        for page in pages:
+            responses.add(responses.GET, f"{api_url_base}/agents/agent-123/messages", json=page)
+
+        messages = list(iter_new_messages_for_agent(
+            agent_id="agent-123",
+            api_url_base=api_url_base,
+            last_message_id=last_id,
+        ))
+
+        first_params = responses.calls[0].request.params
+        # Starts from the stored cursor (none without prior state)
+        assert first_params.get("after") == last_id
+        # Uses correct pagination direction
+        assert first_params.get("order") == "asc"
+
+        assert len(responses.calls) == expected_calls
+        assert len(messages) == expected_msgs
+
+    @responses.activate
+    def test_error_after_full_page_keeps_yielded_messages(self, api_url_base):
+        """Test that an error on a later page stops paging without losing earlier pages."""
+        messages_url = f"{api_url_base}/agents/agent-123/messages"
+        responses.add(responses.GET, messages_url, json=[
+            {"id": f"message-{n:03}", "type": "user_message", "content": "Hi"} for n in range(100)
+        ])
+        responses.add(responses.GET, messages_url, status=500)
+
+        messages = list(iter_new_messages_for_agent("agent-123", api_url_base))
+
+        assert len(responses.calls) == 2
+        assert responses.calls[1].request.params.get("after") == "message-099"
+        assert [m["id"] for m in messages] == [f"message-{n:03}" for n in range(100)]
+
+    @responses.activate
+    def test_fetch_messages_with_prior_state(self, api_url_base):
         """Test fetching messages with a valid last_message_id."""
-        from list_letta_agents import fetch_new_messages_for_agent
-
-        call_count = [0]
-        captured_params = []
-
-        def mock_get_side_effect(*args, **kwargs):
-            call_count[0] += 1
-            params = dict(kwargs.get("params", {}))
-            captured_params.append(params)
-
-            response = Mock()
-            response.status_code = 200
-            response.raise_for_status = Mock()
-
-            # First call with original cursor returns one new message
-            if call_count[0] == 1 and params.get("after") == "message-002":
-                response.json.return_value = [
-                    {"id": "message-003", "type": "user_message", "content": "New message"},
-                ]
-            else:
-                response.json.return_value = []
-            return response
-
-        with patch("list_letta_agents.requests.get", side_effect=mock_get_side_effect):
-            messages = fetch_new_messages_for_agent(
-                agent_id="agent-123",
-                api_url_base=api_url_base,
-                headers=mock_headers,
-                last_message_id="message-002",
-            )
-
-        assert captured_params[0].get("after") == "message-002"
-        assert captured_params[0].get("order") == "asc"
+        messages_url = f"{api_url_base}/agents/agent-123/messages"
+        # First call with original cursor returns one new message
+        responses.add(responses.GET, messages_url, json=[
+            {"id": "message-003", "type": "user_message", "content": "New message"},
+        ], match=[matchers.query_param_matcher({"after": "message-002"}, strict_match=False)])
+        responses.add(responses.GET, messages_url, json=[])
+
+        messages = list(iter_new_messages_for_agent(
+            agent_id="agent-123",
+            api_url_base=api_url_base,
+            last_message_id="message-002",
+        ))
+
+        first_params = responses.calls[0].request.params
+        assert first_params.get("after") == "message-002"
+        assert first_params.get("order") == "asc"
         assert len(messages) == 1
 
-    def test_fetch_messages_404_triggers_fallback(self, mock_headers, api_url_base):
+    @responses.activate
+    def test_fetch_messages_404_triggers_fallback(self, api_url_base):
         """Test that 404 errors trigger fallback to fetch without 'after' param."""
-        from list_letta_agents import fetch_new_messages_for_agent
-        
-        call_count = [0]
-
-        def mock_get_side_effect(*args, **kwargs):
-            call_count[0] += 1
-            response = Mock()
-            
-            if call_count[0] == 1:
-                # First call with 'after' param - raise 404
-                response.status_code = 404
-                response.text = '{"detail": "Message not found"}'
-                error = requests.exceptions.HTTPError(response=response)
-                error.response = response
-                response.raise_for_status.side_effect = error
-                return response
-            elif call_count[0] == 2:
-                # Second call without 'after' - success with message
-                response.status_code = 200
-                response.json.return_value = [
-                    {"id": "message-new", "type": "user_message", "content": "Latest"},
-                ]
-                response.raise_for_status = Mock()
-                return response
-            else:
-                # Third call - no more messages
-                response.status_code = 200
-                response.json.return_value = []
-                response.raise_for_status = Mock()
-                return response
-
-        with patch("list_letta_agents.requests.get", side_effect=mock_get_side_effect):
-            messages = fetch_new_messages_for_agent(
-                agent_id="agent-123",
-                api_url_base=api_url_base,
-                headers=mock_headers,
-                last_message_id="message-deleted",
-            )
-
-            # Should have made at least 2 calls - first with 'after' (404), second without
-            assert call_count[0] >= 2
-            assert len(messages) == 1
-            assert messages[0]["id"] == "message-new"
-
-    def test_fetch_messages_empty_response_does_not_fallback(self, mock_headers, api_url_base):
-        """Test that an empty response with a valid cursor returns no messages.
-
-        With the correct pagination strategy (`order=asc` + `after`), an empty
-        response simply means "no new messages" and should not trigger a fallback.
-        """
-        from list_letta_agents import fetch_new_messages_for_agent
-
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = []
-        mock_response.raise_for_status = Mock()
-
-        with patch("list_letta_agents.requests.get", return_value=mock_response) as mock_get:
-            messages = fetch_new_messages_for_agent(
-                agent_id="agent-123",
-                api_url_base=api_url_base,
-                headers=mock_headers,
-                last_message_id="message-stale",
-            )
-
-        assert mock_get.call_count == 1
-        assert messages == []
-
-    def test_fetch_messages_no_retry_without_after_param(self, mock_headers, api_url_base):
-        """Test that empty response without 'after' param doesn't retry infinitely."""
-        from list_letta_agents import fetch_new_messages_for_agent
-        
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = []
-        mock_response.raise_for_status = Mock()
+        messages_url = f"{api_url_base}/agents/agent-123/messages"
+        # Canned responses are built once at registration and served in order.
+        # First call with 'after' param - 404
+        responses.add(responses.GET, messages_url, json={"detail": "Message not found"}, status=404)
+        # Second call without 'after' - a short page, which also ends the loop
+        responses.add(responses.GET, messages_url, json=[
+            {"id": "message-new", "type": "user_message", "content": "Latest"},
+        ])
+
+        messages = list(iter_new_messages_for_agent(
+            agent_id="agent-123",
+            api_url_base=api_url_base,
+            last_message_id="message-deleted",
+        ))
+
+        # Should have made exactly 2 calls - first with 'after' (404), second without
+        assert len(responses.calls) == 2
+        assert responses.calls[0].request.params.get("after") == "message-deleted"
+        assert "after" not in responses.calls[1].request.params
+        assert len(messages) == 1
+        assert messages[0]["id"] == "message-new"
+
+
+class TestConditionalGet:
+    """Tests for ETag-based conditional requests."""
 
-        with patch("list_letta_agents.requests.get", return_value=mock_response) as mock_get:
-            messages = fetch_new_messages_for_agent(
-                agent_id="agent-123",
-                api_url_base=api_url_base,
-                headers=mock_headers,
-                last_message_id=None,  # No prior state
-            )
+    @responses.activate
+    def test_not_modified_agent_list_reuses_cached_body(self, api_url_base):
+        """Test that a 304 for the agent list returns the previously fetched agents."""
+        agents = [{"id": "agent-123", "name": "Meridian"}]
+        responses.add(responses.GET, f"{api_url_base}/agents/", json=agents, headers={"ETag": '"v1"'})
+        responses.add(responses.GET, f"{api_url_base}/agents/", status=304)
 
-            # Should only make 1 call
-            assert mock_get.call_count == 1
-            assert len(messages) == 0
+        assert list_all_agents(api_url_base) == agents
+        assert list_all_agents(api_url_base) == agents
+
+        assert responses.calls[1].request.headers["If-None-Match"] == '"v1"'
+
+    @responses.activate
+    def test_not_modified_messages_page_is_empty(self, api_url_base):
+        """Test that a 304 for a previously empty messages page yields nothing."""
+        messages_url = f"{api_url_base}/agents/agent-123/messages"
+        responses.add(responses.GET, messages_url, json=[], headers={"ETag": '"empty"'})
+        responses.add(responses.GET, messages_url, status=304)
+
+        assert list(iter_new_messages_for_agent("agent-123", api_url_base, "message-001")) == []
+        assert list(iter_new_messages_for_agent("agent-123", api_url_base, "message-001")) == []
+
+        assert responses.calls[1].request.headers["If-None-Match"] == '"empty"'
+
+
+class TestEtagCachePersistence:
+    """Tests for persisting the ETag cache between runs."""
+
+    @pytest.fixture
+    def etag_path(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "etag_cache.json")
+        monkeypatch.setattr("list_letta_agents.ETAG_CACHE_PATH", path)
+        monkeypatch.setattr("list_letta_agents._ORIGINAL_ETAG_CACHE", {})
+        return path
+
+    @responses.activate
+    def test_round_trip_survives_restart(self, etag_path, api_url_base, monkeypatch):
+        """Test that a saved cache is loaded back and used for the next conditional GET."""
+        agents = [{"id": "agent-123", "name": "Meridian"}]
+        responses.add(responses.GET, f"{api_url_base}/agents/", json=agents, headers={"ETag": '"v1"'})
+        responses.add(responses.GET, f"{api_url_base}/agents/", status=304)
+
+        load_etag_cache()
+        assert list_all_agents(api_url_base) == agents
+        save_etag_cache()
+
+        # Simulate a fresh process
+        monkeypatch.setattr("list_letta_agents._etag_cache", {})
+        load_etag_cache()
+
+        assert list_all_agents(api_url_base) == agents
+        assert responses.calls[1].request.headers["If-None-Match"] == '"v1"'
+
+    def test_save_skips_unchanged_cache(self, etag_path):
+        """Test that saving the cache as loaded does not touch the file."""
+        with open(etag_path, "wb") as f:
+            f.write(orjson.dumps({"http://example/agents/": {"etag": '"v1"', "body": []}}))
+        mtime = os.stat(etag_path).st_mtime_ns
+
+        load_etag_cache()
+        with patch("list_letta_agents.open") as mock_open:
+            save_etag_cache()
+
+        mock_open.assert_not_called()
+        assert os.stat(etag_path).st_mtime_ns == mtime
+
+    def test_prune_drops_pages_for_unknown_agents(self, etag_path, api_url_base):
+        """Test that message pages for agents no longer polled are pruned before saving."""
+        agents_url = f"{api_url_base}/agents/?limit=50"
+        kept_url = f"{api_url_base}/agents/agent-123/messages?limit=50"
+        stale_url = f"{api_url_base}/agents/agent-gone/messages?limit=50"
+        with open(etag_path, "wb") as f:
+            f.write(orjson.dumps({
+                agents_url: {"etag": '"a"', "body": []},
+                kept_url: {"etag": '"b"', "body": []},
+                stale_url: {"etag": '"c"', "body": []},
+            }))
+
+        load_etag_cache()
+        prune_etag_cache(["agent-123"])
+        save_etag_cache()
+
+        with open(etag_path, "rb") as f:
+            assert set(orjson.loads(f.read())) == {agents_url, kept_url}
 
 
 class TestFormatMessageForGraphiti:
@@ -231,8 +284,6 @@ class TestFormatMessageForGraphiti:
 
     def test_format_user_message(self):
         """Test formatting a user message."""
-        from list_letta_agents import format_message_for_graphiti
-        
         message = {
             "id": "message-001",
             "type": "user_message",
@@ -249,8 +300,6 @@ class TestFormatMessageForGraphiti:
 
     def test_format_assistant_message(self):
         """Test formatting an assistant message."""
-        from list_letta_agents import format_message_for_graphiti
-        
         message = {
             "id": "message-002",
             "type": "assistant_message",
@@ -269,8 +318,6 @@ class TestFormatMessageForGraphiti:
         The Letta API returns 'message_type' field but older code expected 'type'.
         This test ensures both field names are handled correctly.
         """
-        from list_letta_agents import format_message_for_graphiti
-        
         # This is the actual format returned by the Letta API
         message = {
             "id": "message-003",
@@ -288,8 +335,6 @@ class TestFormatMessageForGraphiti:
 
     def test_format_user_message_with_api_fields(self):
         """Test formatting user message with actual API field names."""
-        from list_letta_agents import format_message_for_graphiti
-        
         message = {
             "id": "message-004",
             "message_type": "user_message",
@@ -304,10 +349,36 @@ class TestFormatMessageForGraphiti:
         assert result["role_type"] == "user"
         assert "Hello from user" in result["content"]
 
+    def test_format_message_with_dict_content(self):
+        """Test that dict content uses its 'text' field when present."""
+        message = {
+            "id": "message-005",
+            "type": "assistant_message",
+            "content": {"type": "text", "text": "Dict content"},
+            "created_at": "2024-01-01T12:00:00Z",
+        }
+
+        result = format_message_for_graphiti(message)
+
+        assert result is not None
+        assert result["content"] == "Dict content"
+
+    def test_format_message_with_non_dict_content_part(self):
+        """Test that non-dict content parts are ignored rather than raising."""
+        message = {
+            "id": "message-006",
+            "type": "assistant_message",
+            "content": ["stray", {"type": "text", "text": "Hello"}, {"type": "image"}],
+            "created_at": "2024-01-01T12:00:00Z",
+        }
+
+        result = format_message_for_graphiti(message)
+
+        assert result is not None
+        assert result["content"] == "Hello"
+
     def test_skip_tool_return_message(self):
         """Test that tool return messages are skipped."""
-        from list_letta_agents import format_message_for_graphiti
-        
         message = {
             "id": "message-003",
             "type": "tool_return_message",
@@ -321,8 +392,6 @@ class TestFormatMessageForGraphiti:
 
     def test_format_reasoning_message(self):
         """Test formatting a reasoning message."""
-        from list_letta_agents import format_message_for_graphiti
-        
         message = {
             "id": "message-004",
             "type": "reasoning_message",
@@ -336,47 +405,202 @@ class TestFormatMessageForGraphiti:
         assert result["role_type"] == "system"  # reasoning messages use system role
 
 
-class TestDuplicateMessagePrevention:
-    """Tests for duplicate message prevention logic."""
+class TestPollingState:
+    """Tests for polling state persistence."""
 
-    def test_skip_message_matching_last_id(self):
+    @pytest.fixture
+    def state_path(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "polling_state.json")
+        monkeypatch.setattr("list_letta_agents.STATE_FILE_PATH", path)
+        return path
+
+    def test_save_writes_atomically(self, state_path):
+        """Test that state is written via a temp file and loads back intact."""
+        state = load_polling_state()
+        state["agent-123"] = "message-001"
+
+        with patch("list_letta_agents.os.replace", wraps=os.replace) as mock_replace:
+            save_polling_state(state)
+
+        mock_replace.assert_called_once_with(state_path + ".tmp", state_path)
+        assert not os.path.exists(state_path + ".tmp")
+        assert load_polling_state() == {"agent-123": "message-001"}
+
+    def test_save_skips_unchanged_state(self, state_path):
+        """Test that saving the state as loaded does not touch the file."""
+        with open(state_path, "wb") as f:
+            f.write(orjson.dumps({"agent-123": "message-001"}))
+        mtime = os.stat(state_path).st_mtime_ns
+
+        state = load_polling_state()
+        with patch("list_letta_agents.open") as mock_open:
+            save_polling_state(state)
+
+        mock_open.assert_not_called()
+        assert os.stat(state_path).st_mtime_ns == mtime
+
+
+class TestGetAdminUsers:
+    """Tests for the admin user map and its on-disk cache."""
+
+    @pytest.fixture
+    def cache_path(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "admin_users.json")
+        monkeypatch.setattr("list_letta_agents.ADMIN_USERS_CACHE_PATH", path)
+        return path
+
+    @responses.activate
+    def test_fresh_cache_skips_http(self, cache_path, api_url_base):
+        """Test that a cache younger than the TTL is used without an HTTP call."""
+        with open(cache_path, "wb") as f:
+            f.write(orjson.dumps({"user-1": {"id": "user-1", "name": "Emmanuel"}}))
+
+        user_map = get_admin_users(api_url_base)
+
+        assert len(responses.calls) == 0
+        assert user_map["user-1"]["name"] == "Emmanuel"
+
+    @responses.activate
+    def test_stale_cache_is_refreshed(self, cache_path, api_url_base):
+        """Test that an expired cache triggers a fetch and is rewritten."""
+        with open(cache_path, "wb") as f:
+            f.write(orjson.dumps({"user-old": {"id": "user-old", "name": "Old"}}))
+        os.utime(cache_path, (0, 0))
+
+        responses.add(responses.GET, f"{api_url_base}/admin/users/", json=[{"id": "user-1", "name": "Emmanuel"}])
+
+        user_map = get_admin_users(api_url_base)
+
+        assert len(responses.calls) == 1
+        assert list(user_map) == ["user-1"]
+        assert load_cached_admin_users() == user_map
+
+
+class TestGetAgentDetails:
+    """Tests for the cached agent details lookup."""
+
+    @responses.activate
+    def test_repeat_lookup_is_cached(self, api_url_base):
+        """Test that a second lookup for the same agent makes no HTTP call."""
+        responses.add(
+            responses.GET,
+            f"{api_url_base}/agents/agent-cached",
+            json={"id": "agent-cached", "name": "Meridian"},
+        )
+
+        first = get_agent_details("agent-cached", api_url_base)
+        second = get_agent_details("agent-cached", api_url_base)
+
+        assert len(responses.calls) == 1
+        assert first == second == {"id": "agent-cached", "name": "Meridian"}
+
+    @responses.activate
+    def test_errors_are_not_cached(self, api_url_base):
+        """Test that a failed lookup returns None and is retried next time."""
+        responses.add(
+            responses.GET,
+            f"{api_url_base}/agents/agent-flaky",
+            body=requests.exceptions.ConnectionError("down"),
+        )
+
+        assert get_agent_details("agent-flaky", api_url_base) is None
+        assert get_agent_details("agent-flaky", api_url_base) is None
+
+        assert len(responses.calls) == 2
+
+
+class TestMain:
+    """End-to-end tests for a full polling run."""
+
+    @pytest.fixture
+    def state_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("list_letta_agents.STATE_FILE_PATH", str(tmp_path / "polling_state.json"))
+        monkeypatch.setattr("list_letta_agents.ADMIN_USERS_CACHE_PATH", str(tmp_path / "admin_users.json"))
+        monkeypatch.setattr("list_letta_agents.ETAG_CACHE_PATH", str(tmp_path / "etag_cache.json"))
+        monkeypatch.setattr("list_letta_agents._ORIGINAL_ETAG_CACHE", {})
+        return tmp_path
+
+    @pytest.fixture
+    def mock_graphiti(self, monkeypatch):
+        graphiti = MagicMock()
+        graphiti.add_messages.return_value = True
+        monkeypatch.setattr("list_letta_agents.init_graphiti", MagicMock(return_value=graphiti))
+        return graphiti
+
+    @responses.activate
+    def test_failing_agent_keeps_cursor(self, state_dir, mock_graphiti, api_url_base):
         """
-        Test that messages matching last_message_id are skipped.
-        This simulates the main() loop logic.
+        Test that an agent whose messages fail to load keeps its cursor, while the
+        other agent is ingested, has its cursor advanced and skips the message it
+        already processed.
         """
-        # Simulate fetched messages (what fetch_new_messages_for_agent returns)
-        fetched_messages = [
-            {"id": "message-already-processed", "type": "user_message", "content": "Old"},
-        ]
-        
-        # Simulate the skip logic from main()
-        last_message_id_for_agent = "message-already-processed"
-        processed = []
-        
-        for msg in fetched_messages:
-            # This is the actual skip logic from the code
-            if last_message_id_for_agent and msg['id'] == last_message_id_for_agent:
-                continue  # Skip already processed
-            processed.append(msg)
-        
-        assert len(processed) == 0  # Should be skipped
-
-    def test_process_new_messages(self):
-        """Test that new messages (not matching last_id) are processed."""
-        fetched_messages = [
-            {"id": "message-new-1", "type": "user_message", "content": "New 1"},
+        with open(state_dir / "polling_state.json", "wb") as f:
+            f.write(orjson.dumps({"agent-good": "message-old", "agent-bad": "message-bad-old"}))
+
+        responses.add(responses.GET, f"{api_url_base}/admin/users/", json=[{"id": "user-1", "name": "Emmanuel"}])
+        responses.add(responses.GET, f"{api_url_base}/agents/", json=[
+            {"id": "agent-good", "name": "Meridian"},
+            {"id": "agent-bad", "name": "BMO"},
+        ])
+        responses.add(responses.GET, f"{api_url_base}/agents/agent-good/messages", json=[
+            # The stored cursor comes back first and must not be ingested again
+            {"id": "message-old", "type": "user_message", "content": "Old", "sender_id": "user-1"},
+            {"id": "message-new-1", "type": "user_message", "content": "New 1", "sender_id": "user-1"},
             {"id": "message-new-2", "type": "assistant_message", "content": "New 2"},
-        ]
-        
-        last_message_id_for_agent = "message-old"
-        processed = []
-        
-        for msg in fetched_messages:
-            if last_message_id_for_agent and msg['id'] == last_message_id_for_agent:
-                continue
-            processed.append(msg)
-        
-        assert len(processed) == 2  # Both should be processed
+        ])
+        responses.add(responses.GET, f"{api_url_base}/agents/agent-bad/messages", status=500)
+
+        asyncio.run(main())
+
+        with open(state_dir / "polling_state.json", "rb") as f:
+            assert orjson.loads(f.read()) == {"agent-good": "message-new-2", "agent-bad": "message-bad-old"}
+
+        assert len(mock_graphiti.add_messages.call_args_list) == 1
+        group_id, messages = mock_graphiti.add_messages.call_args.args
+        assert group_id == "agent-good"
+        assert [m["content"] for m in messages] == ["New 1", "New 2"]
+
+    @responses.activate
+    def test_error_after_full_page_saves_last_ingested_id(self, state_dir, mock_graphiti, api_url_base):
+        """Test that an error part-way through paging still ingests and checkpoints the earlier pages."""
+        responses.add(responses.GET, f"{api_url_base}/admin/users/", json=[])
+        responses.add(responses.GET, f"{api_url_base}/agents/", json=[{"id": "agent-good", "name": "Meridian"}])
+        messages_url = f"{api_url_base}/agents/agent-good/messages"
+        responses.add(responses.GET, messages_url, json=[
+            {"id": f"message-{n:03}", "type": "user_message", "content": "Hi"} for n in range(100)
+        ])
+        responses.add(responses.GET, messages_url, status=500)
+
+        asyncio.run(main())
+
+        group_id, messages = mock_graphiti.add_messages.call_args.args
+        assert group_id == "agent-good"
+        assert len(messages) == 100
+        with open(state_dir / "polling_state.json", "rb") as f:
+            assert orjson.loads(f.read()) == {"agent-good": "message-099"}
+
+    @pytest.mark.parametrize("send_outcome", [
+        {"side_effect": RuntimeError("Graphiti unavailable")},
+        {"return_value": False},
+    ])
+    @responses.activate
+    def test_failed_send_keeps_cursor(self, state_dir, mock_graphiti, api_url_base, send_outcome):
+        """Test that messages Graphiti did not accept are fetched again on the next run."""
+        mock_graphiti.add_messages.configure_mock(**send_outcome)
+        with open(state_dir / "polling_state.json", "wb") as f:
+            f.write(orjson.dumps({"agent-good": "message-old"}))
+
+        responses.add(responses.GET, f"{api_url_base}/admin/users/", json=[])
+        responses.add(responses.GET, f"{api_url_base}/agents/", json=[{"id": "agent-good", "name": "Meridian"}])
+        responses.add(responses.GET, f"{api_url_base}/agents/agent-good/messages", json=[
+            {"id": "message-new-1", "type": "user_message", "content": "New 1"},
+        ])
+
+        asyncio.run(main())
+
+        mock_graphiti.add_messages.assert_called_once()
+        with open(state_dir / "polling_state.json", "rb") as f:
+            assert orjson.loads(f.read()) == {"agent-good": "message-old"}
 
 
 if __name__ == "__main__":